@@ -1,6 +1,7 @@
 # backend/app/celery_worker.py
 
 import os
+import redis
 import requests
 from celery import Celery
 from pydantic import ValidationError
@@ -10,6 +11,12 @@ from dotenv import load_dotenv
 from .database import SessionLocal, engine
 from . import models
 from .validation import DataGovRecord
+from .rate_limiter import (
+    data_gov_limiter,
+    RateLimitExceeded,
+    PRIORITY_BACKFILL,
+    PRIORITY_REFRESH,
+)
 
 
 # --- Helper Functions (No Change) ---
@@ -81,13 +88,22 @@ celery_app.conf.update(
 )
 
 
+# Retry budget for real network/Redis errors. Requeues caused by the shared rate
+# limiter are normal back-pressure and are counted separately (rate_limit_requeues),
+# so a busy cluster can't use up this budget and drop the task.
+NETWORK_MAX_RETRIES = 5
+# Each requeue backs off for at least a minute, so this is hours of waiting
+RATE_LIMIT_MAX_REQUEUES = 120
+
+
 # 2. Define the UPDATED Task
 @celery_app.task(
     bind=True,
-    autoretry_for=(requests.exceptions.RequestException,),
+    autoretry_for=(requests.exceptions.RequestException, redis.RedisError),
     retry_backoff=True,
-    retry_kwargs={"max_retries": 5},
-    rate_limit="60/m",
+    retry_kwargs={"max_retries": NETWORK_MAX_RETRIES},
+    # No per-worker rate_limit: every page call goes through the shared,
+    # cluster-wide data_gov_limiter instead (see rate_limiter.py)
 )
 def fetch_state_data_for_month(
     self,
@@ -95,12 +111,15 @@ def fetch_state_data_for_month(
     financial_year: str,
     month: str,
     is_historical_backfill: bool = False,
+    rate_limit_requeues: int = 0,
 ):
     """
     Fetches data for a given state, year, and month.
 
     - If is_historical_backfill=True: It will SKIP if data already exists.
-    - If is_historical_backfill=False: It will DELETE existing data and insert fresh data.
+    - If is_historical_backfill=False: It will DELETE existing data and insert fresh data,
+      in the same transaction as the first page, so the period is never left empty
+      while the task waits on the rate limiter.
     """
 
     task_name = f"{state_name}, {financial_year}, {month}"
@@ -109,6 +128,8 @@ def fetch_state_data_for_month(
     API_URL = "https://api.data.gov.in/resource/ee03643a-ee4c-48c2-ac30-9f2ff26ab722"
     API_KEY = os.getenv("DATA_GOV_API_KEY")
 
+    priority = PRIORITY_BACKFILL if is_historical_backfill else PRIORITY_REFRESH
+
     db = SessionLocal()
     try:
 
@@ -131,16 +152,6 @@ def fetch_state_data_for_month(
                     f"SKIPPING historical backfill for {task_name} (data already exists)."
                 )
                 return "Skipped historical backfill (data exists)."
-        else:
-            # This is a refresh for the current year. Delete existing data.
-            print(f"DELETING existing records for current period {task_name}...")
-            db.query(models.DistrictPerformance).filter(
-                models.DistrictPerformance.fin_year == financial_year,
-                models.DistrictPerformance.month == month,
-                models.DistrictPerformance.state_name == state_name,
-            ).delete(synchronize_session=False)
-            db.commit()
-            print("Delete complete.")
         # --- END OF NEW LOGIC ---
 
         # (The rest of the function is the same pagination and insertion loop)
@@ -162,11 +173,22 @@ def fetch_state_data_for_month(
             }
 
             print(f"Fetching page for {task_name}: offset={offset}, limit={limit}...")
-            response = requests.get(API_URL, params=params)
+            response = data_gov_limiter.get(API_URL, params=params, priority=priority)
             response.raise_for_status()
 
             data = response.json()
 
+            if offset == 0 and not is_historical_backfill:
+                # This is a refresh for the current year. Delete existing data only
+                # now that the first page is in hand; it is committed together with
+                # that page's inserts.
+                print(f"DELETING existing records for current period {task_name}...")
+                db.query(models.DistrictPerformance).filter(
+                    models.DistrictPerformance.fin_year == financial_year,
+                    models.DistrictPerformance.month == month,
+                    models.DistrictPerformance.state_name == state_name,
+                ).delete(synchronize_session=False)
+
             if offset == 0:
                 total_records = data.get("total", 0)
                 if total_records == 0:
@@ -282,15 +304,39 @@ def fetch_state_data_for_month(
             if offset >= total_records:
                 all_records_fetched = True
 
+        # Commits the refresh DELETE when the API returned no records
+        db.commit()
+
         print(
             f"SUCCESS: Task complete. Inserted {total_inserted} total records for {task_name}"
         )
         return f"Successfully inserted {total_inserted} records."
 
-    except requests.exceptions.RequestException as e:
+    except RateLimitExceeded as e:
+        # Give the worker slot back instead of sleeping through the shared pause.
+        # This is back-pressure, not a failure, so it has its own budget.
+        db.rollback()
+        if rate_limit_requeues >= RATE_LIMIT_MAX_REQUEUES:
+            print(f"RATE LIMITED for {task_name}: {e}. Giving up.")
+            raise
+        print(f"RATE LIMITED for {task_name}: {e}. Requeueing...")
+        raise self.retry(
+            exc=e,
+            countdown=e.retry_after,
+            # max_retries=None would mean "task default", not unlimited
+            max_retries=self.request.retries + 1,
+            kwargs={
+                **self.request.kwargs,
+                "rate_limit_requeues": rate_limit_requeues + 1,
+            },
+        )
+    except (requests.exceptions.RequestException, redis.RedisError) as e:
+        # Redis errors come from the shared rate limiter; retry rather than leave
+        # a refreshed month deleted and empty.
         print(f"NETWORK ERROR for {task_name}: {e}. Retrying...")
         db.rollback()
-        raise self.retry(exc=e)
+        # self.request.retries also counts rate-limit requeues; don't charge those here
+        raise self.retry(exc=e, max_retries=NETWORK_MAX_RETRIES + rate_limit_requeues)
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         db.rollback()
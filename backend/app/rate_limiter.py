@@ -0,0 +1,332 @@
+# backend/app/rate_limiter.py
+
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import redis
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# --- Priorities ---
+# Current-year refresh pages always get a token as soon as one is available.
+# Backfill pages only get one if the bucket still holds more than BACKFILL_RESERVE
+# tokens, so refresh pages win whenever the bucket is contended.
+# NOTE: this only orders *page requests* of tasks that are already running. It does
+# not reorder the Celery queue; a task that waits too long is handed back to Celery
+# (see RateLimitExceeded) so it stops holding a worker slot.
+PRIORITY_REFRESH = "refresh"
+PRIORITY_BACKFILL = "backfill"
+
+
+# --- Configuration (all rates are requests per second, shared by ALL workers) ---
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL") or os.getenv(
+    "CELERY_BROKER_URL"
+)
+INITIAL_RATE = float(os.getenv("DATA_GOV_INITIAL_RATE", "1.0"))  # same as old 60/m
+MIN_RATE = float(os.getenv("DATA_GOV_MIN_RATE", "0.1"))
+MAX_RATE = float(os.getenv("DATA_GOV_MAX_RATE", "5.0"))
+BURST = float(os.getenv("DATA_GOV_BURST", "5"))
+BACKFILL_RESERVE = float(os.getenv("DATA_GOV_BACKFILL_RESERVE", "2"))
+
+# AIMD: grow the rate linearly in time (req/s gained per second) while the bucket is
+# the bottleneck, cut hard on a 429
+RATE_INCREASE = float(os.getenv("DATA_GOV_RATE_INCREASE", "0.01"))
+# The bucket counts as "limiting" if someone had to wait within this window
+INCREASE_WINDOW_SECONDS = 10.0
+THROTTLE_DECREASE = 0.5  # on 429
+SLOW_DECREASE = 0.9  # on a response slower than SLOW_RESPONSE_SECONDS
+SLOW_RESPONSE_SECONDS = float(os.getenv("DATA_GOV_SLOW_RESPONSE_SECONDS", "10"))
+# Many workers see the same 429 burst; only cut the rate once per cooldown
+DECREASE_COOLDOWN_SECONDS = 5.0
+DEFAULT_RETRY_AFTER_SECONDS = 5.0
+MAX_RETRY_AFTER_SECONDS = 3600.0
+
+MAX_THROTTLED_ATTEMPTS = 5
+# Longest a task may block on the limiter before it is handed back to Celery
+MAX_WAIT_SECONDS = float(os.getenv("DATA_GOV_MAX_WAIT_SECONDS", "60"))
+REQUEST_TIMEOUT_SECONDS = 60
+
+BUCKET_KEY = "datagov:ratelimit:bucket"
+PAUSE_KEY = "datagov:ratelimit:pause_until"
+
+
+# --- Sanity-check the tunables against each other ---
+MIN_RATE = max(MIN_RATE, 0.01)
+MAX_RATE = max(MAX_RATE, MIN_RATE)
+INITIAL_RATE = min(max(INITIAL_RATE, MIN_RATE), MAX_RATE)
+BURST = max(BURST, 1.0)
+if not 0 <= BACKFILL_RESERVE <= BURST - 1:
+    # A reserve above BURST - 1 could never be met: backfill would wait forever
+    print(
+        f"WARNING: DATA_GOV_BACKFILL_RESERVE={BACKFILL_RESERVE} is outside "
+        f"[0, {BURST - 1}] for DATA_GOV_BURST={BURST}; clamping."
+    )
+    BACKFILL_RESERVE = min(max(BACKFILL_RESERVE, 0.0), BURST - 1)
+MAX_WAIT_SECONDS = max(MAX_WAIT_SECONDS, 1.0)
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a page would have to wait longer than MAX_WAIT_SECONDS.
+
+    `retry_after` is the suggested task countdown: the rest of the Retry-After pause
+    if one is active, otherwise a jittered delay long enough for the contention to
+    drain (see contention_countdown).
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"data.gov.in rate limit: retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+# --- Lua scripts (run atomically inside Redis, using Redis' clock) ---
+# Numbers are returned as strings because Redis truncates Lua numbers to integers.
+# ACQUIRE returns {seconds to wait, '1' if that wait is a Retry-After pause else '0'}.
+
+ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local capacity = tonumber(ARGV[1])
+local reserve = tonumber(ARGV[2])
+local default_rate = tonumber(ARGV[3])
+
+local pause_until = tonumber(redis.call('GET', KEYS[2]) or '0')
+if pause_until > now then
+    return {tostring(pause_until - now), '1'}
+end
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate')
+local rate = tonumber(state[3]) or default_rate
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local needed = 1 + reserve
+local wait = 0
+if tokens >= needed then
+    tokens = tokens - 1
+else
+    wait = (needed - tokens) / rate
+    redis.call('HSET', KEYS[1], 'limited_at', tostring(now))
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'rate', tostring(rate))
+return {tostring(wait), '0'}
+"""
+
+FEEDBACK_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local outcome = ARGV[1]
+local retry_after = tonumber(ARGV[2])
+local min_rate = tonumber(ARGV[3])
+local max_rate = tonumber(ARGV[4])
+local increase = tonumber(ARGV[5])
+local throttle_decrease = tonumber(ARGV[6])
+local slow_decrease = tonumber(ARGV[7])
+local cooldown = tonumber(ARGV[8])
+local default_rate = tonumber(ARGV[9])
+local window = tonumber(ARGV[10])
+
+local state = redis.call('HMGET', KEYS[1], 'rate', 'last_decrease', 'limited_at', 'last_increase')
+local rate = tonumber(state[1]) or default_rate
+local last_decrease = tonumber(state[2]) or 0
+local limited_at = tonumber(state[3]) or 0
+local last_increase = tonumber(state[4]) or now
+local can_decrease = (now - last_decrease) >= cooldown
+
+if outcome == 'throttled' then
+    if can_decrease then
+        rate = math.max(min_rate, rate * throttle_decrease)
+        redis.call('HSET', KEYS[1], 'last_decrease', tostring(now))
+    end
+    -- Drain the bucket so nobody bursts straight back into the 429. Refill only
+    -- starts once the (possibly longer, existing) pause is over.
+    local resume_at = math.max(now, tonumber(redis.call('GET', KEYS[2]) or '0'))
+    if retry_after > 0 and now + retry_after > resume_at then
+        resume_at = now + retry_after
+        redis.call('SET', KEYS[2], tostring(resume_at), 'EX', math.ceil(retry_after) + 1)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', '0', 'ts', tostring(resume_at))
+elseif outcome == 'slow' then
+    if can_decrease then
+        rate = math.max(min_rate, rate * slow_decrease)
+        redis.call('HSET', KEYS[1], 'last_decrease', tostring(now))
+    end
+elseif now - limited_at <= window then
+    -- Additive in time, and only while the bucket is actually the bottleneck
+    rate = math.min(max_rate, rate + increase * math.min(now - last_increase, window))
+end
+
+-- Any outcome restarts the increase clock, so growth never builds up credit
+redis.call('HSET', KEYS[1], 'rate', tostring(rate), 'last_increase', tostring(now))
+return tostring(rate)
+"""
+
+
+# --- Helper Functions ---
+def parse_retry_after(value):
+    """Returns the Retry-After header value in seconds (delta or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if retry_at is None:
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(seconds):
+        return None
+    return min(max(0.0, seconds), MAX_RETRY_AFTER_SECONDS)
+
+
+def contention_countdown() -> float:
+    """
+    Countdown for a task that timed out waiting behind other workers.
+
+    The time to the next single token says nothing about how many tasks are queued
+    for it, so back off for at least a full MAX_WAIT_SECONDS, with jitter so the
+    requeued tasks don't all come back at once.
+    """
+    return MAX_WAIT_SECONDS + random.uniform(0, MAX_WAIT_SECONDS)
+
+
+# --- End Helper Functions ---
+
+
+class DataGovRateLimiter:
+    """
+    Cluster-wide adaptive token bucket for data.gov.in, stored in Redis.
+
+    - Every worker draws from the same bucket, so adding workers never adds load.
+    - The refill rate adapts: it grows slowly on healthy responses and is cut on
+      429s (honouring Retry-After for everyone) or on slow responses.
+    - Refresh pages get priority over backfill pages (see BACKFILL_RESERVE).
+    - Redis errors (redis.RedisError) are not swallowed; the task retries on them.
+    """
+
+    def __init__(self, redis_url: str = RATE_LIMIT_REDIS_URL, client=None):
+        self.redis_url = redis_url
+        self._client = client
+        self._acquire = None
+        self._feedback = None
+
+    def _connect(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.redis_url)
+        if self._acquire is None:
+            self._acquire = self._client.register_script(ACQUIRE_SCRIPT)
+            self._feedback = self._client.register_script(FEEDBACK_SCRIPT)
+
+    def _request_token(self, priority: str):
+        """Runs ACQUIRE_SCRIPT. Returns (seconds to wait, whether it is a pause)."""
+        self._connect()
+        reserve = BACKFILL_RESERVE if priority == PRIORITY_BACKFILL else 0
+        wait, paused = self._acquire(
+            keys=[BUCKET_KEY, PAUSE_KEY],
+            args=[BURST, reserve, INITIAL_RATE],
+        )
+        return float(wait), int(paused) == 1
+
+    def try_acquire(self, priority: str = PRIORITY_REFRESH) -> float:
+        """Takes a token if one is available. Returns 0, or the seconds to wait."""
+        return self._request_token(priority)[0]
+
+    def acquire(self, priority: str = PRIORITY_REFRESH, deadline: float = None):
+        """
+        Blocks until a token is available for the given priority.
+
+        Raises RateLimitExceeded instead of waiting past `deadline` (a time.monotonic()
+        value, default MAX_WAIT_SECONDS from now).
+        """
+        if deadline is None:
+            deadline = time.monotonic() + MAX_WAIT_SECONDS
+        while True:
+            wait, paused = self._request_token(priority)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                if paused:
+                    # Upstream told us when to come back; a little jitter spreads
+                    # the requeued tasks over the first moments after the pause
+                    raise RateLimitExceeded(wait + random.uniform(0, 5.0))
+                raise RateLimitExceeded(contention_countdown())
+            # Re-check often enough to notice the rate going back up
+            time.sleep(min(wait, 5.0))
+
+    def record(self, outcome: str, retry_after: float = 0.0) -> float:
+        """Feeds a response outcome back into the shared rate. Returns the new rate."""
+        self._connect()
+        return float(
+            self._feedback(
+                keys=[BUCKET_KEY, PAUSE_KEY],
+                args=[
+                    outcome,
+                    retry_after,
+                    MIN_RATE,
+                    MAX_RATE,
+                    RATE_INCREASE,
+                    THROTTLE_DECREASE,
+                    SLOW_DECREASE,
+                    DECREASE_COOLDOWN_SECONDS,
+                    INITIAL_RATE,
+                    INCREASE_WINDOW_SECONDS,
+                ],
+            )
+        )
+
+    def get(self, url: str, params=None, priority: str = PRIORITY_REFRESH):
+        """
+        Rate-limited replacement for requests.get.
+
+        A 429 is retried here (after the shared pause) up to MAX_THROTTLED_ATTEMPTS
+        times; any other response is returned as-is for the caller to handle.
+        All waiting, including those retries, is capped at MAX_WAIT_SECONDS, after
+        which RateLimitExceeded is raised so the task can be retried by Celery.
+        """
+        deadline = time.monotonic() + MAX_WAIT_SECONDS
+        for attempt in range(1, MAX_THROTTLED_ATTEMPTS + 1):
+            self.acquire(priority, deadline)
+
+            started = time.monotonic()
+            response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+            elapsed = time.monotonic() - started
+
+            if response.status_code == 429:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is None:
+                    retry_after = DEFAULT_RETRY_AFTER_SECONDS
+                rate = self.record("throttled", retry_after)
+                print(
+                    f"RATE LIMITED by data.gov.in (attempt {attempt}/{MAX_THROTTLED_ATTEMPTS}). "
+                    f"Pausing {retry_after:.1f}s, shared rate now {rate:.2f} req/s."
+                )
+                continue
+
+            if elapsed > SLOW_RESPONSE_SECONDS:
+                rate = self.record("slow")
+                print(
+                    f"SLOW response from data.gov.in ({elapsed:.1f}s). "
+                    f"Shared rate now {rate:.2f} req/s."
+                )
+            elif response.ok:
+                self.record("ok")
+            return response
+
+        # Out of attempts: hand back the 429 so raise_for_status() triggers a task retry
+        return response
+
+
+data_gov_limiter = DataGovRateLimiter()
@@ -0,0 +1,118 @@
+# backend/tests/test_rate_limiter.py
+
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from app import rate_limiter
+from app.rate_limiter import (
+    BUCKET_KEY,
+    DataGovRateLimiter,
+    PRIORITY_BACKFILL,
+    PRIORITY_REFRESH,
+    parse_retry_after,
+)
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeStrictRedis()
+
+
+@pytest.fixture
+def limiter(client):
+    return DataGovRateLimiter(client=client)
+
+
+def test_refresh_takes_token_while_backfill_waits_for_reserve(client, limiter):
+    # 1.5 tokens left and (almost) no refill: above 1, below 1 + BACKFILL_RESERVE
+    client.hset(BUCKET_KEY, mapping={"tokens": 1.5, "ts": time.time(), "rate": 0.001})
+
+    assert limiter.try_acquire(PRIORITY_BACKFILL) > 0
+    assert limiter.try_acquire(PRIORITY_REFRESH) == 0
+    assert limiter.try_acquire(PRIORITY_REFRESH) > 0
+
+
+def test_429_halves_rate_once_per_cooldown(client, limiter):
+    client.hset(BUCKET_KEY, "rate", 2.0)
+
+    assert limiter.record("throttled") == pytest.approx(1.0)
+    assert limiter.record("throttled") == pytest.approx(1.0)
+
+
+def test_pause_is_honoured_and_not_followed_by_a_burst(client, limiter):
+    client.hset(BUCKET_KEY, mapping={"tokens": 5, "ts": time.time(), "rate": 20.0})
+
+    limiter.record("throttled", retry_after=1)
+
+    # Paused: nobody gets a token, and the wait covers the pause
+    assert limiter.try_acquire(PRIORITY_REFRESH) == pytest.approx(1.0, abs=0.1)
+
+    time.sleep(1.05)
+
+    # At the (halved) rate of 10/s, a refill counted from the 429 would have filled
+    # the bucket. Counted from the end of the pause there is at most about one token.
+    granted = 0
+    while limiter.try_acquire(PRIORITY_REFRESH) == 0:
+        granted += 1
+    assert granted <= 1
+
+
+def test_rate_only_grows_while_bucket_is_limiting(client, limiter):
+    client.hset(BUCKET_KEY, mapping={"rate": 1.0, "last_increase": time.time() - 5})
+
+    assert limiter.record("ok") == pytest.approx(1.0)
+
+    client.hset(
+        BUCKET_KEY,
+        mapping={"limited_at": time.time(), "last_increase": time.time() - 5},
+    )
+    # Linear in time: 5s at RATE_INCREASE req/s per second
+    assert limiter.record("ok") == pytest.approx(
+        1.0 + 5 * rate_limiter.RATE_INCREASE, rel=0.05
+    )
+
+
+def test_acquire_raises_instead_of_waiting_past_deadline(client, limiter):
+    client.hset(BUCKET_KEY, mapping={"tokens": 0, "ts": time.time(), "rate": 0.01})
+
+    with pytest.raises(rate_limiter.RateLimitExceeded) as exc:
+        limiter.acquire(PRIORITY_REFRESH, deadline=time.monotonic() + 1)
+
+    # Contention, not a pause: back off long enough for the queue to drain
+    assert exc.value.retry_after >= rate_limiter.MAX_WAIT_SECONDS
+
+
+def test_acquire_countdown_follows_active_pause(client, limiter):
+    limiter.record("throttled", retry_after=30)
+
+    with pytest.raises(rate_limiter.RateLimitExceeded) as exc:
+        limiter.acquire(PRIORITY_REFRESH, deadline=time.monotonic() + 1)
+
+    assert 29 <= exc.value.retry_after <= 36
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("120", 120.0), ("0", 0.0), ("-3", 0.0), (None, None), ("soon", None)],
+)
+def test_parse_retry_after_delta_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=90)
+    assert parse_retry_after(format_datetime(retry_at, usegmt=True)) == pytest.approx(
+        90, abs=2
+    )
+
+
+def test_parse_retry_after_rejects_non_finite_and_caps_large_values():
+    assert parse_retry_after("inf") is None
+    assert parse_retry_after("nan") is None
+    assert parse_retry_after("1e12") == rate_limiter.MAX_RETRY_AFTER_SECONDS